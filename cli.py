@@ -1,6 +1,7 @@
 """CLI entry-point replacing the monolithic `coingecko_fetcher.py`."""
 from __future__ import annotations
 
+import argparse
 import json
 import logging
 import sys
@@ -15,8 +16,16 @@ from config import (
     LOG_RETURN_WINDOWS,
 )
 from fetcher import get_market_chart
-from io_utils import write_asset_csv, init_kb, append_kb_row
+from history import compact_history, ingest_history
+from io_utils import (
+    write_asset_csv,
+    init_kb,
+    append_kb_row,
+    merge_kb_fragments,
+    write_kb_fragment,
+)
 from processing import transform_json, enrich_indicators
+from sharding import parse_shard, select_shard
 
 # ---------------------------------------------------------------------------
 
@@ -46,7 +55,9 @@ def process_asset(
     days: str,
     interval: str,
     rsi_windows: List[int],
+    kb_rows: List[tuple[str, Dict]] | None = None,
 ) -> bool:
+    """Refresh one asset; with *kb_rows* its snapshot is collected, not appended."""
     url = info.get("coingecko_id")
     if not url:
         logger.warning("Skipping %s – no CoinGecko URL", symbol)
@@ -60,13 +71,90 @@ def process_asset(
     recs = enrich_indicators(recs, rsi_windows)
 
     write_asset_csv(symbol, recs, rsi_windows, days)
-    append_kb_row(symbol, recs[-1], rsi_windows)
+    if kb_rows is None:
+        append_kb_row(symbol, recs[-1], rsi_windows)
+    else:
+        kb_rows.append((symbol, recs[-1]))
+
+    # History is an optional extra – never let it cost the asset its main outputs
+    try:
+        ingest_history(symbol, raw)
+    except (OSError, ValueError) as exc:
+        logger.error("%s history ingest failed: %s", symbol, exc)
     logger.info("%s processed (%d records)", symbol, len(recs))
     return True
 
 # ---------------------------------------------------------------------------
 
-def main() -> int:
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fetch CoinGecko data and compute indicators.")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["run", "merge", "compact"],
+        default="run",
+        help=(
+            "'run' refreshes assets (default); 'merge' combines shard knowledge-base "
+            "fragments; 'compact' rolls aged history into coarser retention tiers"
+        ),
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="i/N",
+        help="run/compact: only handle shard i of N (run writes a knowledge-base fragment)",
+    )
+    parser.add_argument(
+        "--shards",
+        metavar="N",
+        type=int,
+        help="merge: number of shard fragments to combine",
+    )
+    args = parser.parse_args(argv)
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if args.command == "merge":
+        if args.shard is not None:
+            parser.error("--shard does not apply to merge – did you mean --shards?")
+        if args.shards is None or args.shards <= 0:
+            parser.error("merge requires --shards N with N > 0")
+    elif args.shards is not None:
+        parser.error(f"--shards only applies to merge – did you mean --shard for {args.command}?")
+    return args
+
+# ---------------------------------------------------------------------------
+
+def merge(count: int) -> int:
+    try:
+        merge_kb_fragments(count)
+    except (OSError, ValueError) as exc:
+        logger.error("Merge failed – %s", exc)
+        return 1
+    return 0
+
+# ---------------------------------------------------------------------------
+
+def compact(assets: dict[str, dict]) -> int:
+    failed = 0
+    for sym, info in assets.items():
+        if not info.get("coingecko_id"):
+            continue
+        try:
+            compact_history(sym)
+        except (OSError, ValueError) as exc:
+            logger.error("%s compaction failed: %s", sym, exc)
+            failed += 1
+    return 1 if failed else 0
+
+# ---------------------------------------------------------------------------
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.command == "merge":
+        return merge(args.shards)
+
     vs_currency = "usd"
     days = "365"
     interval = "daily"
@@ -77,7 +165,22 @@ def main() -> int:
         logger.error("No assets to process – check %s", CRYPTOS_PATH)
         return 1
 
-    init_kb(rsi_windows)
+    kb_rows: List[tuple[str, Dict]] | None = None
+    if args.shard is not None:
+        index, count = args.shard
+        assets = select_shard(assets, index, count)
+        kb_rows = []
+        logger.info("Shard %d/%d owns %d assets", index, count, len(assets))
+
+    if args.command == "compact":
+        return compact(assets)
+
+    if kb_rows is None:
+        init_kb(rsi_windows)
+    elif not assets:
+        # An empty shard still writes a header-only fragment so merge can proceed
+        write_kb_fragment(index, count, kb_rows, rsi_windows)
+        return 0
 
     total = len(assets)
     success = 0
@@ -88,7 +191,7 @@ def main() -> int:
 
     def _task(item: tuple[str, Dict]):
         sym, info = item
-        ok = process_asset(sym, info, vs_currency, days, interval, rsi_windows)
+        ok = process_asset(sym, info, vs_currency, days, interval, rsi_windows, kb_rows)
         return ok
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -101,6 +204,9 @@ def main() -> int:
             except Exception as exc:  # pylint: disable=broad-except
                 logger.error("%s failed: %s", sym, exc)
 
+    if kb_rows is not None:
+        write_kb_fragment(index, count, kb_rows, rsi_windows)
+
     elapsed = time.perf_counter() - start_t
     logger.info("Done – %d/%d succeeded in %.1fs (using %d workers)", success, total, elapsed, max_workers)
     return 0 if success else 1
@@ -22,12 +22,33 @@ CRYPTO_DATA_DIR: Path = BASE_DIR / "data"
 # Knowledge-base CSV (aggregated latest snapshot for every asset)
 KB_PATH: Path = BASE_DIR / "knowledgebase.csv"
 
+# Per-shard knowledge-base fragments (``cli.py --shard i/N``), combined into
+# KB_PATH by ``cli.py merge``
+KB_FRAGMENT_DIR: Path = BASE_DIR / "kb_fragments"
+
 # Log file for CoinGecko fetcher
 CG_LOG_PATH: Path = BASE_DIR / "coingecko.log"
 
 # JSON file that lists the assets we want to track
 CRYPTOS_PATH: Path = BASE_DIR / "cryptos.json"
 
+# ---------------------------------------------------------------------------
+# Tiered price history (see ``history.py``)
+# ---------------------------------------------------------------------------
+
+# Root of the per-asset tier files: ``HISTORY_DIR/<asset>/<tier>.csv[.gz]``
+HISTORY_DIR: Path = CRYPTO_DATA_DIR / "history"
+
+# Finest tier first. ``resolution`` and ``max_age`` are in seconds; points in a
+# tier older than ``max_age`` are rolled up into OHLCV bars of the next tier's
+# resolution by ``cli.py compact``. ``max_age=None`` keeps a tier forever, and
+# ``compress`` gzips the tier file.
+RETENTION_TIERS: list[dict] = [
+    {"name": "raw", "resolution": 5 * 60, "max_age": 7 * 86400, "compress": False},
+    {"name": "hourly", "resolution": 3600, "max_age": 90 * 86400, "compress": True},
+    {"name": "daily", "resolution": 86400, "max_age": None, "compress": True},
+]
+
 # ---------------------------------------------------------------------------
 # Technical-indicator parameters
 # ---------------------------------------------------------------------------
@@ -45,6 +66,10 @@ LOG_RETURN_WINDOWS: list[int] = [7, 14, 30]
 # Rate-limit guard – seconds between consecutive CoinGecko calls
 RATE_LIMIT_INTERVAL: float = 1.2
 
+# Optional CoinGecko API key – give each shard its own key to get its own budget
+COINGECKO_API_KEY: str = os.getenv("COINGECKO_API_KEY", "")
+COINGECKO_API_KEY_HEADER: str = os.getenv("COINGECKO_API_KEY_HEADER", "x-cg-demo-api-key")
+
 # ---------------------------------------------------------------------------
 # Optional Telegram integration (currently unused in code base)
 # ---------------------------------------------------------------------------
@@ -55,8 +80,11 @@ TELEGRAM_CHAT_ID: str = os.getenv("TELEGRAM_CHAT_ID", "")
 __all__ = [
     "CRYPTO_DATA_DIR",
     "KB_PATH",
+    "KB_FRAGMENT_DIR",
     "CG_LOG_PATH",
     "CRYPTOS_PATH",
+    "HISTORY_DIR",
+    "RETENTION_TIERS",
     "BB_WINDOW",
     "BB_STD_DEV",
     "MACD_SHORT_WINDOW",
@@ -65,6 +93,8 @@ __all__ = [
     "MOMENTUM_WINDOWS",
     "LOG_RETURN_WINDOWS",
     "RATE_LIMIT_INTERVAL",
+    "COINGECKO_API_KEY",
+    "COINGECKO_API_KEY_HEADER",
     "TELEGRAM_BOT_TOKEN",
     "TELEGRAM_CHAT_ID",
 ]
@@ -9,7 +9,7 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-from config import RATE_LIMIT_INTERVAL
+from config import COINGECKO_API_KEY, COINGECKO_API_KEY_HEADER, RATE_LIMIT_INTERVAL
 
 # Session with retry policy ---------------------------------------------------
 
@@ -52,10 +52,14 @@ def get_market_chart(
 
     final_url = urlunparse(parsed._replace(query=urlencode(q, doseq=True)))
 
+    headers = {"User-Agent": "Mozilla/5.0"}
+    if COINGECKO_API_KEY:
+        headers[COINGECKO_API_KEY_HEADER] = COINGECKO_API_KEY
+
     _respect_rate_limit()
 
     try:
-        r = sess.get(final_url, timeout=15, headers={"User-Agent": "Mozilla/5.0"})
+        r = sess.get(final_url, timeout=15, headers=headers)
         r.raise_for_status()
         data = r.json()
         if not isinstance(data, dict) or "prices" not in data:
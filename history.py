@@ -0,0 +1,282 @@
+"""Tiered price history with retention-based compaction.
+
+Each asset keeps one file per tier in :data:`config.RETENTION_TIERS`, finest
+first. Fresh points land in the finest tier; :func:`compact_history` rolls
+points that outlive a tier's ``max_age`` into OHLCV bars of the next tier, so
+every tier except the last holds a bounded window and the file sizes stay
+roughly constant as history accumulates. Tiers never overlap in time – coarser
+tiers always hold strictly older data – which lets :func:`load_history` stitch
+them into one series by simple concatenation. Ingestion and compaction hold a
+per-asset lock while they rewrite the tiers, so a refresh and a separately
+scheduled compaction never overwrite each other's changes; readers need no
+lock because every tier file is replaced atomically.
+
+Rows are ``(timestamp_ms, open, high, low, close, volume)``. ``volume`` is
+CoinGecko's rolling 24h total, so a bar keeps the closing snapshot rather than
+summing it.
+"""
+from __future__ import annotations
+
+import gzip
+import logging
+import os
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import HISTORY_DIR, RETENTION_TIERS
+from io_utils import atomic_write_bytes
+
+Bar = Tuple[int, float, float, float, float, float]
+
+_HEADER = "Timestamp,Open,High,Low,Close,Volume\n"
+
+# Seconds to wait for another process to release an asset's lock
+_LOCK_TIMEOUT = 60.0
+
+# ---------------------------------------------------------------------------
+
+
+def _try_lock(fd: int):
+    """Take a non-blocking exclusive lock on *fd*; ``OSError`` if it is held."""
+    if os.name == "nt":
+        import msvcrt  # pylint: disable=import-outside-toplevel
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl  # pylint: disable=import-outside-toplevel
+
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+@contextmanager
+def _asset_lock(asset: str) -> Iterator[None]:
+    """Hold an exclusive OS lock on ``HISTORY_DIR/<asset>/.lock`` for the block.
+
+    The lock belongs to the open file, so the OS drops it when the holder exits
+    or crashes – there is no stale lock to detect or break. The file itself is
+    left in place; deleting it would let two processes lock different inodes.
+    """
+    path = HISTORY_DIR / asset.lower() / ".lock"
+    path.parent.mkdir(exist_ok=True, parents=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        deadline = time.monotonic() + _LOCK_TIMEOUT
+        delay = 0.01
+        while True:
+            try:
+                _try_lock(fd)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"timed out waiting for history lock {path}") from None
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
+
+# ---------------------------------------------------------------------------
+
+
+def _tier_path(asset: str, tier: dict) -> Path:
+    suffix = ".csv.gz" if tier["compress"] else ".csv"
+    return HISTORY_DIR / asset.lower() / f"{tier['name']}{suffix}"
+
+
+def _read_tier(path: Path) -> List[Bar]:
+    if not path.exists():
+        return []
+    data = path.read_bytes()
+    try:
+        if path.suffix == ".gz":
+            data = gzip.decompress(data)
+        bars: list[Bar] = []
+        for line in data.decode("utf-8").splitlines()[1:]:
+            ts, o, h, l, c, v = line.split(",")
+            bars.append((int(ts), float(o), float(h), float(l), float(c), float(v)))
+    except (EOFError, gzip.BadGzipFile, zlib.error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"corrupt history tier {path}: {exc}") from exc
+    return bars
+
+
+def _write_tier(path: Path, bars: List[Bar]):
+    lines = [_HEADER]
+    lines.extend(f"{ts},{o!r},{h!r},{l!r},{c!r},{v!r}\n" for ts, o, h, l, c, v in bars)
+    data = "".join(lines).encode("utf-8")
+    if path.suffix == ".gz":
+        data = gzip.compress(data, mtime=0)
+    atomic_write_bytes(path, data)
+
+
+def _resample(bars: List[Bar], resolution: int) -> List[Bar]:
+    """Aggregate time-sorted *bars* into buckets of *resolution* seconds."""
+    step = resolution * 1000
+    out: list[Bar] = []
+    for ts, o, h, l, c, v in bars:
+        bucket = ts - ts % step
+        if out and out[-1][0] == bucket:
+            _, po, ph, pl, _, _ = out[-1]
+            out[-1] = (bucket, po, max(ph, h), min(pl, l), c, v)
+        else:
+            out.append((bucket, o, h, l, c, v))
+    return out
+
+# ---------------------------------------------------------------------------
+
+
+def ingest_history(asset: str, data: Dict[str, Any]) -> int:
+    """Append points from a CoinGecko *market_chart* response to the finest tier.
+
+    Only points newer than everything already stored are kept, so re-fetching
+    an overlapping window is harmless. Returns the number of points added.
+    """
+    prices = data.get("prices", [])
+    total_volumes = data.get("total_volumes", [])
+
+    with _asset_lock(asset):
+        finest = RETENTION_TIERS[0]
+        path = _tier_path(asset, finest)
+        bars = _read_tier(path)
+
+        # Coarser tiers only ever hold older data, so stop at the first non-empty
+        # one. A rolled bar stands for its whole bucket, not just its start.
+        last_ts = -1
+        for tier in RETENTION_TIERS:
+            if tier is finest:
+                stored = bars
+                covered = 0
+            else:
+                stored = _read_tier(_tier_path(asset, tier))
+                covered = tier["resolution"] * 1000 - 1
+            if stored:
+                last_ts = stored[-1][0] + covered
+                break
+
+        added = 0
+        for idx, (ts, price) in enumerate(prices):
+            ts = int(ts)
+            if ts <= last_ts:
+                continue
+            price = float(price)
+            volume = (
+                float(total_volumes[idx][1]) if idx < len(total_volumes) and len(total_volumes[idx]) > 1 else 0.0
+            )
+            bars.append((ts, price, price, price, price, volume))
+            last_ts = ts
+            added += 1
+
+        if added:
+            _write_tier(path, bars)
+            logging.debug("%s: ingested %d points into %s", asset, added, path)
+    return added
+
+
+def compact_history(asset: str, now: Optional[float] = None) -> Dict[str, int]:
+    """Roll aged points of every tier into the next, coarser tier.
+
+    Only whole buckets of the coarser tier are rolled, so a bar is never split
+    across two compactions. A last tier with a finite ``max_age`` simply drops
+    expired bars. Returns the bar count per tier after compaction.
+    """
+    now_ms = int((time.time() if now is None else now) * 1000)
+    with _asset_lock(asset):
+        paths = [_tier_path(asset, tier) for tier in RETENTION_TIERS]
+        tiers = [_read_tier(path) for path in paths]
+        dirty = [False] * len(tiers)
+
+        for k, tier in enumerate(RETENTION_TIERS):
+            if tier["max_age"] is None or not tiers[k]:
+                continue
+            cutoff = now_ms - tier["max_age"] * 1000
+            nxt = RETENTION_TIERS[k + 1] if k + 1 < len(RETENTION_TIERS) else None
+            if nxt is not None:
+                step = nxt["resolution"] * 1000
+                cutoff -= cutoff % step
+
+            split = 0
+            while split < len(tiers[k]) and tiers[k][split][0] < cutoff:
+                split += 1
+            if not split:
+                continue
+
+            aged, tiers[k] = tiers[k][:split], tiers[k][split:]
+            dirty[k] = True
+            if nxt is not None:
+                tiers[k + 1] = _resample(tiers[k + 1] + _resample(aged, nxt["resolution"]), nxt["resolution"])
+                dirty[k + 1] = True
+
+        # Coarsest first: a crash between two writes leaves a rolled bucket in
+        # both tiers rather than losing it
+        for path, bars, changed in reversed(list(zip(paths, tiers, dirty))):
+            if changed:
+                _write_tier(path, bars)
+
+    counts = {tier["name"]: len(bars) for tier, bars in zip(RETENTION_TIERS, tiers)}
+    logging.info("%s: compacted history %s", asset, counts)
+    return counts
+
+
+def load_history(
+    asset: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Return one stitched series for ``[start, end)`` (epoch seconds).
+
+    Each tier contributes its own resolution; pass *resolution* (seconds) to
+    aggregate the whole series onto a common grid. Tiers entirely older than
+    *start* are not read. Records use the same keys as
+    :func:`processing.transform_json` so they can be fed to
+    :func:`processing.enrich_indicators`.
+    """
+    start_ms = None if start is None else int(start * 1000)
+    end_ms = None if end is None else int(end * 1000)
+
+    # Finest tier first. A coarser bar is only kept if it ends before the
+    # oldest point already taken from a finer tier: a read racing a
+    # compaction, or a compaction that crashed between its two writes, can
+    # briefly leave a bucket in both tiers, and the finer copy wins.
+    chunks: list[list[Bar]] = []
+    floor: int | None = None
+    for tier in RETENTION_TIERS:
+        step = tier["resolution"] * 1000
+        bars = [
+            bar for bar in _read_tier(_tier_path(asset, tier))
+            if floor is None or bar[0] + step <= floor
+        ]
+        if not bars:
+            continue
+        chunks.append(bars)
+        floor = bars[0][0]
+        if start_ms is not None and floor <= start_ms:
+            break
+
+    series: list[Bar] = []
+    for bars in reversed(chunks):
+        series.extend(
+            bar for bar in bars
+            if (start_ms is None or bar[0] >= start_ms) and (end_ms is None or bar[0] < end_ms)
+        )
+    if resolution:
+        series = _resample(series, resolution)
+
+    return [
+        {
+            "Date": datetime.utcfromtimestamp(ts / 1000).strftime("%Y-%m-%d %H:%M:%S"),
+            "Open": o,
+            "High": h,
+            "Low": l,
+            "Price": c,
+            "Volume": v,
+            "crypto": asset,
+        }
+        for ts, o, h, l, c, v in series
+    ]
+
+__all__ = ["ingest_history", "compact_history", "load_history"]
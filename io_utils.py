@@ -2,11 +2,23 @@
 from __future__ import annotations
 
 import csv
+import hashlib
+import io
 import logging
+import os
+import tempfile
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
 
-from config import CRYPTO_DATA_DIR, KB_PATH, MOMENTUM_WINDOWS, LOG_RETURN_WINDOWS
+from config import (
+    CRYPTO_DATA_DIR,
+    KB_FRAGMENT_DIR,
+    KB_PATH,
+    MOMENTUM_WINDOWS,
+    LOG_RETURN_WINDOWS,
+)
 
 # ---------------------------------------------------------------------------
 
@@ -15,18 +27,79 @@ def ensure_dirs():
     CRYPTO_DATA_DIR.mkdir(exist_ok=True, parents=True)
     KB_PATH.parent.mkdir(exist_ok=True, parents=True)
 
+
+# Attempts for os.replace – on Windows it fails with PermissionError while
+# another process (a reader, Excel, ...) holds the target open
+_REPLACE_ATTEMPTS = 5
+_REPLACE_BACKOFF = 0.1
+
+# mkstemp creates files 0600; outputs get the usual 0666 & ~umask instead. The
+# umask can only be read by setting it, so do that once, before any threads.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Write *data* to a temp file beside *path* then ``os.replace`` it in."""
+    path.parent.mkdir(exist_ok=True, parents=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())  # data must be on disk before the rename is
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        for attempt in range(_REPLACE_ATTEMPTS):
+            try:
+                os.replace(tmp, path)
+                break
+            except PermissionError:
+                if attempt == _REPLACE_ATTEMPTS - 1:
+                    raise
+                time.sleep(_REPLACE_BACKOFF * 2 ** attempt)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
 # ---------------------------------------------------------------------------
 
 
-def write_asset_csv(
-    asset: str,
-    records: List[Dict[str, Any]],
-    rsi_windows: List[int],
-    days: str,
-) -> Path:
-    """Write per-asset historical CSV and return its path."""
-    ensure_dirs()
-    path = CRYPTO_DATA_DIR / f"{asset.lower()}_{days}d.csv"
+_NEEDS_QUOTING = (",", '"', "\r", "\n")
+_CSV_EOL = "\r\n"  # same terminator csv.writer uses by default
+
+
+def _fmt_str(value: Any) -> str:
+    if value is None:
+        return ""
+    text = str(value)
+    if any(ch in text for ch in _NEEDS_QUOTING):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+@lru_cache(maxsize=None)
+def _compile_row_formatter(header: Tuple[str, ...]) -> Tuple[str, Callable[[Dict[str, Any]], str]]:
+    """Return the header line and a row formatter for *header*.
+
+    The column lookups are bound once per header and floats – nearly every
+    cell – take a direct ``float.__repr__`` path instead of going through
+    ``csv.DictWriter``'s per-field dict handling. Output matches
+    ``csv.DictWriter(extrasaction="ignore")`` byte for byte.
+    """
+    keys = tuple(header)
+    float_repr = float.__repr__
+    fmt_str = _fmt_str
+
+    def fmt_row(rec: Dict[str, Any]) -> str:
+        return ",".join([
+            float_repr(v) if v.__class__ is float else "" if v is None else fmt_str(v)
+            for v in map(rec.get, keys)
+        ]) + _CSV_EOL
+
+    return ",".join(_fmt_str(key) for key in keys) + _CSV_EOL, fmt_row
+
+
+def _asset_header(rsi_windows: List[int]) -> Tuple[str, ...]:
     header: list[str] = [
         "Date",
         "Open",
@@ -55,23 +128,67 @@ def write_asset_csv(
         header.append(f"momentum_{w}")
     for w in LOG_RETURN_WINDOWS:
         header.append(f"log_return_{w}")
+    return tuple(header)
+
+
+def _digest_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.sha256")
 
+
+def _read_digest(path: Path) -> Tuple[str, int, int] | None:
+    """Return ``(sha256, size, mtime_ns)`` recorded for *path*'s last write."""
     try:
-        with path.open("w", newline="", encoding="utf-8") as fp:
-            writer = csv.DictWriter(fp, fieldnames=header, extrasaction="ignore")
-            writer.writeheader()
-            for rec in records:
-                writer.writerow(rec)
-        logging.info("Wrote %s", path)
-    except Exception as exc:  # pylint: disable=broad-except
-        logging.exception("Failed writing %s – %s", path, exc)
+        digest, size, mtime_ns = _digest_path(path).read_text(encoding="utf-8").split()
+        return digest, int(size), int(mtime_ns)
+    except (OSError, ValueError):
+        return None
+
+
+def write_asset_csv(
+    asset: str,
+    records: List[Dict[str, Any]],
+    rsi_windows: List[int],
+    days: str,
+) -> Path:
+    """Write per-asset historical CSV and return its path.
+
+    Writes go through a temp file and ``os.replace``, so readers never see a
+    truncated file. The SHA-256, size and mtime of the last write are kept
+    beside it, and identical output is not rewritten while the file on disk
+    is still the one recorded. I/O errors propagate to the caller.
+    """
+    ensure_dirs()
+    path = CRYPTO_DATA_DIR / f"{asset.lower()}_{days}d.csv"
+    header_line, fmt_row = _compile_row_formatter(_asset_header(rsi_windows))
+
+    data = (header_line + "".join([fmt_row(rec) for rec in records])).encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+
+    prev = _read_digest(path)
+    if prev is not None:
+        try:
+            st = path.stat()
+            if prev == (digest, st.st_size, st.st_mtime_ns):
+                logging.info("Unchanged %s", path)
+                return path
+        except FileNotFoundError:
+            pass
+
+    atomic_write_bytes(path, data)
+    st = path.stat()
+    atomic_write_bytes(_digest_path(path), f"{digest} {st.st_size} {st.st_mtime_ns}\n".encode("utf-8"))
+    logging.info("Wrote %s", path)
     return path
 
 # ---------------------------------------------------------------------------
 
 
-def init_kb(rsi_windows: List[int]):
-    ensure_dirs()
+def kb_fragment_path(index: int, count: int) -> Path:
+    """Knowledge-base fragment written by shard ``index`` of ``count``."""
+    return KB_FRAGMENT_DIR / f"knowledgebase.{index}of{count}.csv"
+
+
+def _kb_header(rsi_windows: List[int]) -> list[str]:
     header = [
         "Crypto",
         "Date",
@@ -96,13 +213,10 @@ def init_kb(rsi_windows: List[int]):
     for w in LOG_RETURN_WINDOWS:
         header.append(f"LogReturn_{w}")
     header.append("OBV")
-
-    with KB_PATH.open("w", newline="", encoding="utf-8") as fp:
-        csv.writer(fp).writerow(header)
-    logging.info("Initialized knowledge-base %s", KB_PATH)
+    return header
 
 
-def append_kb_row(asset: str, latest: Dict[str, Any], rsi_windows: List[int]):
+def _kb_row(asset: str, latest: Dict[str, Any], rsi_windows: List[int]) -> list[Any]:
     row = [
         asset,
         latest["Date"],
@@ -128,12 +242,86 @@ def append_kb_row(asset: str, latest: Dict[str, Any], rsi_windows: List[int]):
     for w in LOG_RETURN_WINDOWS:
         row.append(latest.get(f"log_return_{w}"))
     row.append(latest.get("obv"))
+    return row
 
+
+def init_kb(rsi_windows: List[int]):
+    ensure_dirs()
+    with KB_PATH.open("w", newline="", encoding="utf-8") as fp:
+        csv.writer(fp).writerow(_kb_header(rsi_windows))
+    logging.info("Initialized knowledge-base %s", KB_PATH)
+
+
+def append_kb_row(asset: str, latest: Dict[str, Any], rsi_windows: List[int]):
     with KB_PATH.open("a", newline="", encoding="utf-8") as fp:
-        csv.writer(fp).writerow(row)
+        csv.writer(fp).writerow(_kb_row(asset, latest, rsi_windows))
+
+
+def write_kb_fragment(
+    index: int,
+    count: int,
+    latest_rows: List[Tuple[str, Dict[str, Any]]],
+    rsi_windows: List[int],
+) -> Path:
+    """Write a finished shard's ``(asset, latest record)`` pairs in one go.
+
+    The fragment only appears once the shard is done, so :func:`merge_kb_fragments`
+    never sees a half-written one.
+    """
+    path = kb_fragment_path(index, count)
+    buf = io.StringIO(newline="")
+    writer = csv.writer(buf)
+    writer.writerow(_kb_header(rsi_windows))
+    writer.writerows(_kb_row(asset, latest, rsi_windows) for asset, latest in latest_rows)
+    atomic_write_bytes(path, buf.getvalue().encode("utf-8"))
+    logging.info("Wrote knowledge-base fragment %s (%d rows)", path, len(latest_rows))
+    return path
+
+
+def merge_kb_fragments(count: int) -> Path:
+    """Combine the ``count`` shard fragments into :data:`KB_PATH` atomically.
+
+    Raises ``FileNotFoundError`` if any shard has not produced its fragment and
+    ``ValueError`` if the fragments disagree on the header, leaving the
+    existing knowledge-base untouched in both cases. Fragments are deleted
+    after a successful merge, so a fragment left over from an earlier run can
+    never be merged in place of one a crashed shard failed to write.
+    """
+    if count <= 0:
+        raise ValueError("count must be positive")
+    header: list[str] | None = None
+    rows: list[list[str]] = []
+    for index in range(count):
+        frag = kb_fragment_path(index, count)
+        if not frag.exists():
+            raise FileNotFoundError(f"missing knowledge-base fragment {frag}")
+        with frag.open("r", newline="", encoding="utf-8") as fp:
+            reader = csv.reader(fp)
+            frag_header = next(reader, None)
+            if frag_header is None:
+                raise ValueError(f"empty knowledge-base fragment {frag}")
+            if header is None:
+                header = frag_header
+            elif frag_header != header:
+                raise ValueError(f"header mismatch in {frag}")
+            rows.extend(reader)
+
+    buf = io.StringIO(newline="")
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    writer.writerows(rows)
+    atomic_write_bytes(KB_PATH, buf.getvalue().encode("utf-8"))
+    for index in range(count):
+        kb_fragment_path(index, count).unlink(missing_ok=True)
+    logging.info("Merged %d fragments (%d rows) into %s", count, len(rows), KB_PATH)
+    return KB_PATH
 
 __all__ = [
+    "atomic_write_bytes",
     "write_asset_csv",
+    "kb_fragment_path",
     "init_kb",
     "append_kb_row",
+    "write_kb_fragment",
+    "merge_kb_fragments",
 ]
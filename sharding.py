@@ -0,0 +1,45 @@
+"""Deterministic partitioning of the asset universe across worker processes.
+
+Assets are assigned with rendezvous (highest-random-weight) hashing on the
+lower-cased symbol: every shard scores the symbol and the highest score wins.
+Growing from *N* to *N + 1* shards therefore only moves the ~1/(N + 1) of
+assets that the new shard wins, and every process – on any host – computes the
+same assignment without coordination.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Tuple
+
+# ---------------------------------------------------------------------------
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse an ``"i/N"`` shard spec into ``(index, count)``."""
+    try:
+        index_s, count_s = spec.split("/", 1)
+        index, count = int(index_s), int(count_s)
+    except ValueError as exc:
+        raise ValueError(f"invalid shard spec {spec!r} – expected i/N") from exc
+    if count <= 0 or not 0 <= index < count:
+        raise ValueError(f"invalid shard spec {spec!r} – need 0 <= i < N")
+    return index, count
+
+
+def _score(symbol: str, shard: int) -> int:
+    digest = hashlib.blake2b(f"{symbol.lower()}:{shard}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_of(symbol: str, count: int) -> int:
+    """Return the shard index in ``[0, count)`` that owns *symbol*."""
+    if count <= 0:
+        raise ValueError("count must be positive")
+    return max(range(count), key=lambda shard: _score(symbol, shard))
+
+
+def select_shard(assets: Dict[str, dict], index: int, count: int) -> Dict[str, dict]:
+    """Return the subset of *assets* owned by shard ``index`` of ``count``."""
+    return {sym: info for sym, info in assets.items() if shard_of(sym, count) == index}
+
+__all__ = ["parse_shard", "shard_of", "select_shard"]
@@ -0,0 +1,131 @@
+"""Tests for the tiered history store in history.py."""
+from __future__ import annotations
+
+import pytest
+
+import history
+
+NOW = 20370 * 86400.0  # a whole day boundary, in epoch seconds
+DAY = 86400
+HOUR = 3600
+
+
+@pytest.fixture
+def history_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DIR", tmp_path / "history")
+    monkeypatch.setattr(history, "RETENTION_TIERS", [
+        {"name": "raw", "resolution": 300, "max_age": 2 * DAY, "compress": False},
+        {"name": "hourly", "resolution": HOUR, "max_age": 10 * DAY, "compress": True},
+        {"name": "daily", "resolution": DAY, "max_age": None, "compress": True},
+    ])
+    return tmp_path / "history"
+
+
+def _chart(start: float, end: float, step: int = 300) -> dict:
+    """A *market_chart* response with one point every *step* seconds."""
+    prices, volumes = [], []
+    for i, ts in enumerate(range(int(start), int(end), step)):
+        prices.append([ts * 1000, 100.0 + i % 97])
+        volumes.append([ts * 1000, float(i)])
+    return {"prices": prices, "total_volumes": volumes}
+
+
+def _timestamps(asset: str, tier: str) -> list[int]:
+    spec = next(t for t in history.RETENTION_TIERS if t["name"] == tier)
+    return [bar[0] for bar in history._read_tier(history._tier_path(asset, spec))]
+
+
+def test_compaction_rolls_whole_next_tier_buckets(history_dir):
+    history.ingest_history("X", _chart(NOW - 30 * DAY + 1234, NOW))
+    counts = history.compact_history("X", now=NOW)
+
+    raw, hourly, daily = (_timestamps("X", t) for t in ("raw", "hourly", "daily"))
+    assert counts == {"raw": len(raw), "hourly": len(hourly), "daily": len(daily)}
+    assert all(ts % (HOUR * 1000) == 0 for ts in hourly)
+    assert all(ts % (DAY * 1000) == 0 for ts in daily)
+    # Raw keeps everything from the hour-aligned cutoff on, hourly from the
+    # day-aligned one, and every rolled bucket ends at or before the next tier
+    raw_cutoff = (NOW - 2 * DAY) * 1000
+    assert raw_cutoff <= raw[0] < raw_cutoff + 300 * 1000
+    assert hourly[0] == (NOW - 10 * DAY) * 1000 and hourly[-1] + HOUR * 1000 <= raw[0]
+    assert daily[-1] + DAY * 1000 <= hourly[0]
+
+
+def test_compaction_bar_is_ohlcv_of_its_points(history_dir):
+    chart = _chart(NOW - 3 * DAY, NOW - 3 * DAY + HOUR)
+    history.ingest_history("X", chart)
+    history.compact_history("X", now=NOW)
+    (bar,) = history._read_tier(history._tier_path("X", history.RETENTION_TIERS[1]))
+    prices = [p for _, p in chart["prices"]]
+    assert bar[1:] == (prices[0], max(prices), min(prices), prices[-1], chart["total_volumes"][-1][1])
+
+
+def test_compaction_is_idempotent(history_dir):
+    history.ingest_history("X", _chart(NOW - 30 * DAY, NOW))
+    history.compact_history("X", now=NOW)
+    files = {p: p.read_bytes() for p in history_dir.rglob("*.csv*")}
+    history.compact_history("X", now=NOW)
+    assert {p: p.read_bytes() for p in history_dir.rglob("*.csv*")} == files
+
+
+def test_load_history_is_sorted_without_duplicates(history_dir):
+    history.ingest_history("X", _chart(NOW - 30 * DAY, NOW))
+    history.compact_history("X", now=NOW)
+    dates = [rec["Date"] for rec in history.load_history("X")]
+    assert dates == sorted(dates)
+    assert len(dates) == len(set(dates))
+    assert len(dates) == sum(len(_timestamps("X", t)) for t in ("raw", "hourly", "daily"))
+
+
+def test_load_history_prefers_finer_tier_after_interrupted_compaction(history_dir):
+    history.ingest_history("X", _chart(NOW - 4 * DAY, NOW))
+    raw_path = history._tier_path("X", history.RETENTION_TIERS[0])
+    before = raw_path.read_bytes()
+    expected = history.load_history("X")
+    history.compact_history("X", now=NOW)
+    raw_path.write_bytes(before)  # as if the crash hit before raw was rewritten
+    assert history.load_history("X") == expected
+
+
+def test_load_history_range_skips_older_tiers(history_dir, monkeypatch):
+    history.ingest_history("X", _chart(NOW - 30 * DAY, NOW))
+    history.compact_history("X", now=NOW)
+
+    read = []
+    real_read = history._read_tier
+    monkeypatch.setattr(history, "_read_tier", lambda path: read.append(path.name) or real_read(path))
+    recs = history.load_history("X", start=NOW - DAY, end=NOW - DAY + HOUR)
+    assert read == ["raw.csv"]
+    assert len(recs) == HOUR // 300
+    assert recs[0]["Date"] == history.datetime.utcfromtimestamp(NOW - DAY).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def test_load_history_resamples_to_coarser_resolution(history_dir):
+    chart = _chart(NOW - DAY, NOW)
+    history.ingest_history("X", chart)
+    recs = history.load_history("X", resolution=HOUR)
+    assert len(recs) == 24
+    first = [p for ts, p in chart["prices"] if ts < (NOW - DAY + HOUR) * 1000]
+    assert (recs[0]["Open"], recs[0]["High"], recs[0]["Low"], recs[0]["Price"]) == (
+        first[0], max(first), min(first), first[-1]
+    )
+
+
+def test_reingesting_overlap_after_full_compaction_adds_nothing(history_dir):
+    chart = _chart(NOW - 30 * DAY, NOW - 20 * DAY)
+    history.ingest_history("X", chart)
+    history.compact_history("X", now=NOW)
+    assert _timestamps("X", "raw") == []
+    before = history.load_history("X")
+
+    assert history.ingest_history("X", chart) == 0
+    assert history.load_history("X") == before
+
+
+def test_truncated_gzip_tier_raises_value_error_naming_file(history_dir):
+    history.ingest_history("X", _chart(NOW - 30 * DAY, NOW))
+    history.compact_history("X", now=NOW)
+    path = history._tier_path("X", history.RETENTION_TIERS[2])
+    path.write_bytes(path.read_bytes()[:20])
+    with pytest.raises(ValueError, match="daily.csv.gz"):
+        history.compact_history("X", now=NOW)
@@ -0,0 +1,111 @@
+"""Tests for the CSV writers and knowledge-base fragment merge in io_utils."""
+from __future__ import annotations
+
+import csv
+import io
+import os
+
+import pytest
+
+import io_utils
+
+RSI_WINDOWS = [7, 14, 21]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(io_utils, "CRYPTO_DATA_DIR", tmp_path / "data")
+    monkeypatch.setattr(io_utils, "KB_PATH", tmp_path / "knowledgebase.csv")
+    monkeypatch.setattr(io_utils, "KB_FRAGMENT_DIR", tmp_path / "kb_fragments")
+    return tmp_path / "data"
+
+
+def _records() -> list[dict]:
+    return [
+        {"Date": "2024-06-08 00:00:00", "Price": 3679.3766523741783, "Volume": 16199024684.298843,
+         "obv": 0.0, "crypto": "WETH"},
+        {"Date": "2024-06-09 00:00:00", "Price": 3683.0253801346485, "Volume": 7575768941,
+         "obv": 7575768941.686513, "24h_Change": 0.09916700857781809, "1d_Return": -1e-07,
+         "rsi_7": 71.5, "rsi_7_status": "OVERBOUGHT", "macd": None},
+        {"Date": "2024-06-10 00:00:00", "Price": 1.5e-05, "Volume": 0.0,
+         "rsi_14": 28.0, "rsi_14_status": 'odd, "quoted"\nstatus', "momentum_7": float("nan")},
+    ]
+
+
+def _dictwriter_bytes(records: list[dict]) -> bytes:
+    buf = io.StringIO(newline="")
+    writer = csv.DictWriter(buf, fieldnames=io_utils._asset_header(RSI_WINDOWS), extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(records)
+    return buf.getvalue().encode("utf-8")
+
+
+def test_write_asset_csv_matches_dictwriter(data_dir):
+    records = _records()
+    path = io_utils.write_asset_csv("WETH", records, RSI_WINDOWS, "365")
+    assert path == data_dir / "weth_365d.csv"
+    assert path.read_bytes() == _dictwriter_bytes(records)
+
+
+def test_write_asset_csv_skips_unchanged(data_dir):
+    records = _records()
+    path = io_utils.write_asset_csv("WETH", records, RSI_WINDOWS, "365")
+    mtime = path.stat().st_mtime_ns
+    io_utils.write_asset_csv("WETH", records, RSI_WINDOWS, "365")
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_write_asset_csv_rewrites_modified_file(data_dir):
+    records = _records()
+    path = io_utils.write_asset_csv("WETH", records, RSI_WINDOWS, "365")
+    expected = path.read_bytes()
+    path.write_bytes(b"x" * len(expected))  # same size, different content
+    io_utils.write_asset_csv("WETH", records, RSI_WINDOWS, "365")
+    assert path.read_bytes() == expected
+
+
+def _latest(price: float) -> dict:
+    return {"Date": "2024-06-10 00:00:00", "Price": price, "Volume": 1.0}
+
+
+def test_empty_shard_writes_header_only_fragment(data_dir):
+    path = io_utils.write_kb_fragment(1, 3, [], RSI_WINDOWS)
+    assert path == io_utils.kb_fragment_path(1, 3)
+    assert path.read_text(encoding="utf-8").splitlines() == [",".join(io_utils._kb_header(RSI_WINDOWS))]
+
+
+def test_merge_kb_fragments_combines_and_deletes(data_dir):
+    io_utils.write_kb_fragment(0, 2, [("AAA", _latest(1.0))], RSI_WINDOWS)
+    io_utils.write_kb_fragment(1, 2, [("BBB", _latest(2.0)), ("CCC", _latest(3.0))], RSI_WINDOWS)
+    path = io_utils.merge_kb_fragments(2)
+    with path.open(newline="", encoding="utf-8") as fp:
+        rows = list(csv.reader(fp))
+    assert rows[0] == io_utils._kb_header(RSI_WINDOWS)
+    assert [row[0] for row in rows[1:]] == ["AAA", "BBB", "CCC"]
+    assert not any(io_utils.kb_fragment_path(i, 2).exists() for i in range(2))
+
+
+def test_merge_kb_fragments_refuses_missing_fragment(data_dir):
+    io_utils.KB_PATH.write_text("previous\n", encoding="utf-8")
+    io_utils.write_kb_fragment(0, 2, [("AAA", _latest(1.0))], RSI_WINDOWS)
+    with pytest.raises(FileNotFoundError, match="1of2"):
+        io_utils.merge_kb_fragments(2)
+    assert io_utils.KB_PATH.read_text(encoding="utf-8") == "previous\n"
+    assert io_utils.kb_fragment_path(0, 2).exists()
+
+
+def test_merge_kb_fragments_refuses_header_mismatch(data_dir):
+    io_utils.KB_PATH.write_text("previous\n", encoding="utf-8")
+    io_utils.write_kb_fragment(0, 2, [("AAA", _latest(1.0))], RSI_WINDOWS)
+    io_utils.write_kb_fragment(1, 2, [("BBB", _latest(2.0))], [14])
+    with pytest.raises(ValueError, match="header mismatch"):
+        io_utils.merge_kb_fragments(2)
+    assert io_utils.KB_PATH.read_text(encoding="utf-8") == "previous\n"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permission bits")
+def test_atomic_write_bytes_honours_umask(tmp_path):
+    path = tmp_path / "out.csv"
+    io_utils.atomic_write_bytes(path, b"x")
+    assert path.stat().st_mode & 0o777 == 0o666 & ~io_utils._UMASK
+    assert [p.name for p in tmp_path.iterdir()] == ["out.csv"]
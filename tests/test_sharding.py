@@ -0,0 +1,42 @@
+"""Tests for the deterministic asset → shard assignment."""
+from __future__ import annotations
+
+import pytest
+
+from sharding import parse_shard, select_shard, shard_of
+
+SYMBOLS = [f"asset{i}" for i in range(2000)]
+
+
+@pytest.mark.parametrize("spec", ["2/2", "1/0", "a/b", "-1/2", "3", ""])
+def test_parse_shard_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_shard(spec)
+
+
+def test_parse_shard_accepts_valid_spec():
+    assert parse_shard("1/4") == (1, 4)
+
+
+def test_every_symbol_lands_in_exactly_one_shard():
+    assets = {sym: {} for sym in SYMBOLS}
+    shards = [select_shard(assets, i, 5) for i in range(5)]
+    assert sum(len(shard) for shard in shards) == len(assets)
+    assert set().union(*shards) == set(assets)
+    assert all(shards), "a shard received no assets"
+
+
+def test_assignment_ignores_symbol_case():
+    assert shard_of("WETH", 7) == shard_of("weth", 7)
+
+
+@pytest.mark.parametrize("count", [1, 2, 5, 8])
+def test_adding_a_shard_only_moves_assets_to_the_new_shard(count):
+    moved = 0
+    for sym in SYMBOLS:
+        before, after = shard_of(sym, count), shard_of(sym, count + 1)
+        if before != after:
+            assert after == count
+            moved += 1
+    # Roughly 1/(N + 1) of the assets should move
+    assert 0.5 / (count + 1) < moved / len(SYMBOLS) < 1.5 / (count + 1)